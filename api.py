@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import os
+import re
+from typing import List
+from bson.errors import InvalidId
+from fastapi import FastAPI, File, HTTPException, Query, UploadFile
+from pydantic import BaseModel
+from db import get_report, get_all_reports, search_reports, get_report_stats, setup_indexes
+from cache import report_cache
+import service
+
+# Maximum number of ingest/chat jobs running at once (each makes LLM calls)
+MAX_CONCURRENT_JOBS = int(os.getenv("API_MAX_CONCURRENT_JOBS", 8))
+
+# Page size bounds for report listings
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Fields returned by report listings (no raw_text or dedup signatures)
+LISTING_FIELDS = {"filename": 1, "summary": 1, "uploaded_at": 1}
+
+class ChatRequest(BaseModel):
+    question: str
+
+# Short listing entry for search results
+def report_summary(report):
+    return {
+        "report_id": str(report["_id"]),
+        "filename": report["filename"],
+        "summary": report["summary"],
+        "uploaded_at": report["uploaded_at"].isoformat()
+    }
+
+# Build the HTTP API around the service layer (pass a model to use a fake LLM);
+# run with `uvicorn api:create_app --factory`
+def create_app(model=None):
+    # Per-turn token counts are logged at INFO (uvicorn leaves the root logger at WARNING)
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger("memory").setLevel(logging.INFO)
+    app = FastAPI(title="WhiteCoatAI API")
+    setup_indexes()
+    model = model or service.create_model()
+    jobs = asyncio.Semaphore(MAX_CONCURRENT_JOBS)
+
+    # Run blocking pipeline work in a worker thread, bounded by the job semaphore
+    async def run_job(func, *args):
+        async with jobs:
+            return await asyncio.to_thread(func, *args)
+
+    async def load_report(report_id):
+        try:
+            report = await asyncio.to_thread(get_report, report_id)
+        except InvalidId:
+            report = None
+        if not report:
+            raise HTTPException(status_code=404, detail="Report not found")
+        return report
+
+    async def ingest(file):
+        data = await file.read()
+        return await run_job(service.ingest_document, model, file.filename, file.content_type, data)
+
+    @app.post("/reports")
+    async def ingest_report(file: UploadFile = File(...)):
+        try:
+            return await ingest(file)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+    @app.post("/reports/batch")
+    async def ingest_batch(files: List[UploadFile] = File(...)):
+        results = await asyncio.gather(*(ingest(file) for file in files), return_exceptions=True)
+        return [
+            {"filename": file.filename, "error": str(result)} if isinstance(result, Exception) else result
+            for file, result in zip(files, results)
+        ]
+
+    @app.get("/reports")
+    async def list_reports(
+        q: str = "",
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        skip: int = Query(0, ge=0)
+    ):
+        if q:
+            # Plain-text search; user input is never interpreted as a regex
+            reports_list = await asyncio.to_thread(search_reports, re.escape(q), limit, skip, LISTING_FIELDS)
+        else:
+            reports_list = await asyncio.to_thread(get_all_reports, limit, skip, LISTING_FIELDS)
+        return [report_summary(report) for report in reports_list]
+
+    @app.get("/reports/{report_id}")
+    async def read_report(report_id: str):
+        return service.serialize_report(await load_report(report_id))
+
+    @app.post("/reports/{report_id}/chat")
+    async def chat(report_id: str, request: ChatRequest):
+        await load_report(report_id)
+        reply = await run_job(service.answer_question, model, report_id, request.question)
+        return {"reply": reply}
+
+    @app.get("/stats")
+    async def stats():
+        report_stats = await asyncio.to_thread(get_report_stats)
+        for key in ("most_recent", "oldest"):
+            if report_stats[key]:
+                report_stats[key] = report_stats[key].isoformat()
+        return {"reports": report_stats, "cache": report_cache.stats()}
+
+    return app
@@ -3,22 +3,24 @@ import pandas as pd
 import plotly.express as px
 from datetime import datetime
 import io
-import base64
-import os
-from dotenv import load_dotenv
-import google.generativeai as genai
-from db import save_report, get_all_reports
-from db import get_report, add_chat, get_report_stats
+import logging
+from db import get_all_reports
+from db import get_report, get_report_stats
+from db import search_reports, delete_report, delete_all_reports, setup_indexes
+from cache import report_cache
+import service
 
-# Load .env variables
-load_dotenv()
-api_key = os.getenv("GEMINI_API_KEY")
-genai.configure(api_key=api_key)
+# Log prompt token counts and other diagnostics to the console
+logging.basicConfig(level=logging.INFO)
 
-# for m in genai.list_models():
-#     print(m.name, m.supported_generation_methods)
+# Gemini client configured from .env (see service.create_model)
+model = service.create_model()
 
-model = genai.GenerativeModel("models/gemini-flash-latest")
+# Create MongoDB indexes once per server process
+@st.cache_resource
+def init_database():
+    setup_indexes()
+    return True
 
 # Set page configuration
 st.set_page_config(
@@ -27,39 +29,14 @@ st.set_page_config(
     layout="wide",
     initial_sidebar_state="expanded"
 )
+init_database()
 
 # Extract text from uploaded file using Gemini
 def extract_text(file):
-    if file.type == "application/pdf":
-        # Read the PDF file and encode it as base64
-        pdf_bytes = file.getvalue()
-        base64_pdf = base64.b64encode(pdf_bytes).decode('utf-8')
-        
-        # Create a prompt for Gemini to extract text from the PDF
-        prompt = "Extract all text content from this PDF document. Format it clearly and preserve the structure."
-        
-        # Create parts with the PDF attachment
-        parts = [
-            {"text": prompt},
-            {
-                "inline_data": {
-                    "mime_type": "application/pdf",
-                    "data": base64_pdf
-                }
-            }
-        ]
-        
-        # Send to Gemini for text extraction
-        try:
-            response = model.generate_content(parts)
-            return response.text
-        except Exception as e:
-            st.error(f"Error extracting text with Gemini: {str(e)}")
-            return ""
-    elif file.type == "text/plain":
-        text = file.read().decode("utf-8")
-        return text
-    else:
+    try:
+        return service.extract_text(model, file.getvalue(), file.type)
+    except Exception as e:
+        st.error(f"Error extracting text with Gemini: {str(e)}")
         return ""
 
 # Custom CSS for styling
@@ -79,13 +56,9 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-# Session state init
-if 'chat_history' not in st.session_state:
-    st.session_state.chat_history = []
+# Session state init (sessions only hold IDs; report data comes from the shared cache)
 if 'active_page' not in st.session_state:
     st.session_state.active_page = "Home"
-if 'document_text' not in st.session_state:
-    st.session_state.document_text = ""
 
 # Sidebar navigation
 with st.sidebar:
@@ -125,28 +98,21 @@ elif st.session_state.active_page == "Upload Documents":
         st.success(f"File uploaded: {uploaded_file.name}")
         with st.spinner("Extracting and analyzing with Gemini..."):
             raw_text = extract_text(uploaded_file)
-        st.session_state.document_text = raw_text
         st.subheader("📄 Extracted Text Preview")
         # Replace text_area with markdown display
         with st.expander("View extracted content", expanded=True):
             st.markdown(raw_text[:3000])
         if raw_text.strip():
             st.subheader("🧠 Medical Summary (Gemini)")
-            prompt = f"Summarize this medical report for a patient in simple language:\n\n{raw_text}"
             
             with st.spinner("Generating summary..."):
-                response = model.generate_content(prompt)
-                summary = response.text
+                # ✅ Summarize and save to MongoDB
+                report_id, summary, duplicate = service.create_report(model, uploaded_file.name, raw_text)
+                if duplicate:
+                    reused = " Its summary was reused." if duplicate['reused_results'] else ""
+                    st.info(f"Looks like a copy of {duplicate['filename']} ({duplicate['similarity']:.0%} similar).{reused}")
                 st.write(summary)
 
-                # ✅ Save to MongoDB
-                report_id = save_report(
-                    filename=uploaded_file.name,
-                    raw_text=raw_text,
-                    summary=summary,
-                    parsed_results={}  # You can replace this with actual parsed test data later
-                )
-
                 # Store report ID for chat use
                 st.session_state.report_id = report_id
 
@@ -154,96 +120,17 @@ elif st.session_state.active_page == "Upload Documents":
 elif st.session_state.active_page == "Analysis":
     st.header("📊 Analysis Dashboard")
     
-    if "document_text" not in st.session_state or not st.session_state.document_text.strip():
+    report = get_report(st.session_state.report_id) if "report_id" in st.session_state else None
+    if not report or not report['raw_text'].strip():
         st.warning("Please upload and analyze a medical document first to generate graphs.")
     else:
         with st.spinner("Analyzing document and generating visualizations..."):
-            # Prompt Gemini to extract structured data for visualization
-            prompt = f"""
-            Based on the following medical document, generate data for 5 numerical visualizations:
-            1. Blood Test Results with normal ranges (bar chart)
-            2. Vital Signs over time (line chart if time-series data available)
-            3. Cholesterol Levels (HDL, LDL, Total) as a bar chart
-            4. Key Health Metrics Comparison (numerical indicators like BMI, blood pressure, glucose levels)
-            5. Lab Results Trends (if multiple dates available, show trends for key metrics)
-
-            For each visualization, provide the data in a structured JSON format that can be easily parsed.
-            Only include visualizations where relevant numerical data is actually present in the document.
-            Make sure all values are numeric when possible, or explicitly marked as string values when necessary.
-            
-            Format your response exactly like this example:
-            ```json
-            {{
-                "visualization1": {{
-                    "title": "Blood Test Results",
-                    "type": "bar", 
-                    "data": [
-                        {{"Test": "Hemoglobin", "Value": 14.2, "Normal Range Min": 13.5, "Normal Range Max": 17.5}},
-                        {{"Test": "WBC", "Value": 7.5, "Normal Range Min": 4.5, "Normal Range Max": 11.0}}
-                    ]
-                }},
-                "visualization2": {{
-                    "title": "Vital Signs Over Time",
-                    "type": "line",
-                    "data": [
-                        {{"Date": "2024-01-01", "Blood Pressure": 120, "Heart Rate": 72, "Temperature": 98.6}},
-                        {{"Date": "2024-01-15", "Blood Pressure": 118, "Heart Rate": 75, "Temperature": 98.4}}
-                    ]
-                }},
-                "visualization3": {{
-                    "title": "Cholesterol Levels",
-                    "type": "bar",
-                    "data": [
-                        {{"Type": "HDL", "Value": 62, "Target": 60}},
-                        {{"Type": "LDL", "Value": 128, "Target": 100}},
-                        {{"Type": "Total", "Value": 210, "Target": 200}}
-                    ]
-                }},
-                "visualization4": {{
-                    "title": "Key Health Metrics",
-                    "type": "radar",
-                    "data": [
-                        {{"Metric": "BMI", "Value": 24.2, "Ideal Range": 22.5}},
-                        {{"Metric": "Systolic BP", "Value": 122, "Ideal Range": 120}},
-                        {{"Metric": "Diastolic BP", "Value": 78, "Ideal Range": 80}},
-                        {{"Metric": "Glucose", "Value": 92, "Ideal Range": 90}}
-                    ]
-                }},
-                "visualization5": {{
-                    "title": "Lab Results Trends",
-                    "type": "line",
-                    "data": [
-                        {{"Date": "2023-10-01", "Hemoglobin": 14.0, "Glucose": 95, "Creatinine": 0.9}},
-                        {{"Date": "2024-01-15", "Hemoglobin": 14.2, "Glucose": 92, "Creatinine": 0.85}}
-                    ]
-                }}
-            }}
-            ```
-            
-            Return ONLY the JSON, with no additional explanation. If a particular visualization cannot be created due to lack of data, exclude it from the JSON completely.
-            
-            Medical document:
-            {st.session_state.document_text}
-            """
-            
             try:
-                response = model.generate_content(prompt)
-                result_text = response.text
-                
-                # Extract the JSON part
-                import json
-                import re
-                
-                # Find JSON between triple backticks if present
-                json_match = re.search(r'```json\s*(.*?)\s*```', result_text, re.DOTALL)
-                if json_match:
-                    json_str = json_match.group(1)
-                else:
-                    # Otherwise just try to parse the whole response
-                    json_str = result_text
+                # Reuse visualization data already generated for this report in any session
+                result_text = service.analyze_report(model, st.session_state.report_id)
                 
                 try:
-                    visualizations = json.loads(json_str)
+                    visualizations = service.parse_visualizations(result_text)
                     
                     # Create tabs for each visualization
                     tabs = []
@@ -369,7 +256,7 @@ elif st.session_state.active_page == "Analysis":
                     else:
                         st.info("No visualizations could be generated from the document. The document may not contain structured medical data.")
                 
-                except json.JSONDecodeError as e:
+                except ValueError as e:
                     st.error(f"Failed to parse Gemini's response as JSON: {str(e)}")
                     st.text_area("Raw response from Gemini:", value=result_text, height=300)
             
@@ -410,23 +297,8 @@ elif st.session_state.active_page == "Chat":
 
                 if submitted and user_input.strip():
                     with st.spinner("Thinking..."):
-                        prompt = f"""
-You are an AI medical assistant. Use the following information to answer in a patient-friendly way.
-
---- SUMMARY ---
-{report['summary']}
-
---- FULL REPORT ---
-{report['raw_text']}
-
-Patient's question: {user_input}
-
-Respond in a friendly, helpful tone.
-                        """
-                        response = model.generate_content(prompt)
-                        bot_reply = response.text
-
-                        add_chat(st.session_state.report_id, user_input, bot_reply)
+                        # Last few turns verbatim, older ones via the rolling summary
+                        service.answer_question(model, st.session_state.report_id, user_input)
 
                     # ✅ Input will auto-clear because of clear_on_submit=True
                     st.rerun()
@@ -452,6 +324,12 @@ elif st.session_state.active_page == "History":
         # Display statistics
         stats = get_report_stats()
         st.metric("Total Documents", stats["total_reports"])
+        cache_stats = report_cache.stats()
+        st.caption(
+            f"Report cache: {cache_stats['entries']} entries, "
+            f"{cache_stats['bytes'] / 1024 / 1024:.1f} / {cache_stats['max_bytes'] / 1024 / 1024:.0f} MB, "
+            f"{cache_stats['hit_rate']:.0%} hit rate"
+        )
     
     # No reports case
     if not reports_list:
@@ -475,14 +353,12 @@ elif st.session_state.active_page == "History":
                         # Action buttons
                         if st.button("📊 Analysis", key=f"analyze_{i}"):
                             # Load this report into session state and redirect to analysis
-                            st.session_state.document_text = report['raw_text']
                             st.session_state.report_id = str(report['_id'])
                             st.session_state.active_page = "Analysis"
                             st.rerun()
                         
                         if st.button("💬 Chat", key=f"chat_{i}"):
                             # Load this report into session state and redirect to chat
-                            st.session_state.document_text = report['raw_text']
                             st.session_state.report_id = str(report['_id'])
                             st.session_state.active_page = "Chat"
                             st.rerun()
@@ -511,17 +387,7 @@ elif st.session_state.active_page == "History":
                             )
                         elif download_option == "Full Report":
                             import json
-                            report_copy = dict(report)
-                            # Convert ObjectId to string for JSON serialization
-                            report_copy['_id'] = str(report_copy['_id'])
-                            # Convert datetime to string
-                            report_copy['uploaded_at'] = report_copy['uploaded_at'].isoformat()
-                            # Convert chat history timestamps
-                            for chat in report_copy.get('chat_history', []):
-                                if 'timestamp' in chat:
-                                    chat['timestamp'] = chat['timestamp'].isoformat()
-                            
-                            report_json = json.dumps(report_copy, indent=2)
+                            report_json = json.dumps(service.serialize_report(report), indent=2)
                             st.download_button(
                                 label="Download",
                                 data=report_json,
@@ -565,7 +431,6 @@ elif st.session_state.active_page == "History":
                             st.metric("Length", f"{doc_length//1000}K")
                         
                         if st.button("Open", key=f"grid_open_{report['_id']}"):
-                            st.session_state.document_text = report['raw_text']
                             st.session_state.report_id = str(report['_id'])
                             st.session_state.active_page = "Analysis"
                             st.rerun()
@@ -634,14 +499,9 @@ elif st.session_state.active_page == "History":
         if st.button("Clear All History"):
             confirm = st.checkbox("I understand this will permanently delete all reports")
             if confirm:
-                import pymongo
-                # Drop the collection
-                client.drop_database("WhiteCoatAI")
-                # Recreate the collection
-                db = client["WhiteCoatAI"]
-                reports = db["MedicalReports"]
+                # Remove all reports and their cached data
+                delete_all_reports()
                 st.success("All history cleared successfully!")
-                st.session_state.document_text = ""
                 if "report_id" in st.session_state:
                     del st.session_state.report_id
                 st.rerun()
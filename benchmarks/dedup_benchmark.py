@@ -0,0 +1,169 @@
+"""Precision/recall and lookup latency of near-duplicate report detection.
+
+Builds a synthetic corpus of lab reports, re-sends a share of them as
+re-scans (new header, OCR noise, reflowed lines, fax footer) and checks
+which copies are matched back to their original. Lookups through the LSH
+band index are timed against a linear scan over all signatures.
+
+Amended copies (same report, one result value changed), also as re-scans,
+are looked up too: they are expected to be flagged, but results must never
+be reused for them (dedup.numbers_match fails). Re-scans and unchanged
+re-sends (reflowed whitespace only) show how often reuse does apply.
+
+    python benchmarks/dedup_benchmark.py --reports 2000 --duplicates 500
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dedup import (
+    DUPLICATE_THRESHOLD, band_keys, estimate_similarity, find_duplicate, minhash_signature, numbers_match,
+    numeric_values
+)
+
+TESTS = [
+    ("Hemoglobin", "g/dL", 12.0, 17.5), ("Hematocrit", "%", 36.0, 50.0), ("WBC", "x10^3/uL", 4.0, 11.0),
+    ("RBC", "x10^6/uL", 4.2, 5.9), ("Platelets", "x10^3/uL", 150, 400), ("MCV", "fL", 80, 100),
+    ("Glucose", "mg/dL", 70, 140), ("BUN", "mg/dL", 7, 20), ("Creatinine", "mg/dL", 0.6, 1.3),
+    ("Sodium", "mmol/L", 135, 145), ("Potassium", "mmol/L", 3.5, 5.1), ("Chloride", "mmol/L", 98, 107),
+    ("Calcium", "mg/dL", 8.5, 10.5), ("ALT", "U/L", 7, 56), ("AST", "U/L", 10, 40),
+    ("Total Cholesterol", "mg/dL", 120, 240), ("HDL", "mg/dL", 35, 80), ("LDL", "mg/dL", 60, 190),
+    ("Triglycerides", "mg/dL", 50, 250), ("TSH", "mIU/L", 0.4, 4.5), ("HbA1c", "%", 4.5, 9.0),
+    ("Vitamin D", "ng/mL", 15, 80), ("Ferritin", "ng/mL", 20, 300), ("CRP", "mg/L", 0.1, 10.0)
+]
+FIRST_NAMES = ["Maria", "James", "Aisha", "Wei", "Carlos", "Priya", "John", "Fatima", "Liam", "Sofia"]
+LAST_NAMES = ["Garcia", "Smith", "Khan", "Chen", "Lopez", "Patel", "Brown", "Ali", "Murphy", "Rossi"]
+CLINICS = ["Northside Clinic", "Lakeview Medical Lab", "City Diagnostics", "St. Mary Outpatient"]
+
+def make_report(rng):
+    lines = [
+        f"{rng.choice(CLINICS)} - Laboratory Report",
+        f"Patient: {rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}    MRN: {rng.randint(100000, 999999)}",
+        f"Collected: 2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}    Ordering physician: Dr. {rng.choice(LAST_NAMES)}",
+        "",
+        "Test                Result      Units        Reference Range"
+    ]
+    for name, unit, low, high in rng.sample(TESTS, rng.randint(10, 18)):
+        value = round(rng.uniform(low * 0.8, high * 1.2), 1)
+        flag = " H" if value > high else " L" if value < low else ""
+        lines.append(f"{name:<20}{value:<12}{unit:<13}{low} - {high}{flag}")
+    lines += ["", "Comments: " + rng.choice([
+        "Fasting specimen.", "Non-fasting specimen.", "Repeat in 3 months.", "Results reviewed by pathologist."
+    ])]
+    return "\n".join(lines)
+
+# Re-scan of the same report: new header, OCR character noise and a fax footer
+def make_rescan(rng, text):
+    lines = text.split("\n")
+    lines[0] = f"FAX {rng.randint(100, 999)}-{rng.randint(1000, 9999)}  Page 1/1  Received {rng.randint(1, 12)}/{rng.randint(1, 28)}/2024"
+    noisy = []
+    for ch in "\n".join(lines):
+        roll = rng.random()
+        if roll < 0.01 and ch.isalpha():
+            noisy.append(rng.choice("Il1O0"))
+        elif roll < 0.02 and ch == " ":
+            noisy.append("  ")
+        else:
+            noisy.append(ch)
+    return "".join(noisy) + "\nThis facsimile contains confidential health information."
+
+# Amended report: identical except for one corrected result value
+def make_value_change(rng, text):
+    lines = text.split("\n")
+    row = rng.randrange(5, 5 + sum(1 for line in lines[5:] if line and not line.startswith("Comments")))
+    name, value = lines[row][:20], lines[row][20:32].strip()
+    changed = str(round(float(value) + rng.choice([-1, 1]) * rng.uniform(0.1, 5.0), 1))
+    lines[row] = f"{name}{changed:<12}{lines[row][32:]}"
+    return "\n".join(lines)
+
+# Unchanged re-send: same content, different line wrapping and spacing
+def make_resend(rng, text):
+    return "\n".join("   ".join(line.split()) for line in text.split("\n")) + "\n"
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, default=2000, help="original reports in the index")
+    parser.add_argument("--duplicates", type=int, default=500, help="copies of each kind to look up")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    originals = [make_report(rng) for _ in range(args.reports)]
+
+    # Index the originals the way Mongo's multikey index on lsh_bands does
+    start = time.perf_counter()
+    signatures = [minhash_signature(text) for text in originals]
+    numbers = [numeric_values(text) for text in originals]
+    index = defaultdict(set)
+    for report_id, signature in enumerate(signatures):
+        for key in band_keys(signature):
+            index[key].add(report_id)
+    print(f"Indexed {args.reports} reports in {time.perf_counter() - start:.2f}s")
+
+    # Queries: re-scans of known originals plus the same number of unseen reports
+    queries = [("rescan", make_rescan(rng, originals[i]), i) for i in rng.sample(range(args.reports), args.duplicates)]
+    queries += [("unseen", make_report(rng), None) for _ in range(args.duplicates)]
+    queries += [("amended", make_value_change(rng, originals[i]), i) for i in rng.sample(range(args.reports), args.duplicates)]
+    queries += [("resend", make_resend(rng, originals[i]), i) for i in rng.sample(range(args.reports), args.duplicates)]
+    queries += [
+        ("amended rescan", make_rescan(rng, make_value_change(rng, originals[i])), i)
+        for i in rng.sample(range(args.reports), args.duplicates)
+    ]
+
+    true_pos = false_pos = false_neg = 0
+    flagged, reused = defaultdict(int), defaultdict(int)
+    lsh_times, scan_times, candidate_counts = [], [], []
+    for kind, text, expected in queries:
+        signature = minhash_signature(text)
+
+        start = time.perf_counter()
+        candidate_ids = set()
+        for key in band_keys(signature):
+            candidate_ids |= index.get(key, set())
+        candidates = [{"_id": i, "minhash": signatures[i]} for i in candidate_ids]
+        match, _ = find_duplicate(signature, candidates)
+        lsh_times.append(time.perf_counter() - start)
+        candidate_counts.append(len(candidate_ids))
+
+        start = time.perf_counter()
+        for other in signatures:
+            estimate_similarity(signature, other)
+        scan_times.append(time.perf_counter() - start)
+
+        found = match["_id"] if match else None
+        if found is not None:
+            flagged[kind] += 1
+            # Same rule as service.create_report for reusing a duplicate's results
+            if numbers_match(numbers[found], numeric_values(text)):
+                reused[kind] += 1
+        if kind not in ("rescan", "unseen"):
+            continue
+        if found is not None and found == expected:
+            true_pos += 1
+        elif found is not None:
+            false_pos += 1
+        if expected is not None and found != expected:
+            false_neg += 1
+
+    precision = true_pos / (true_pos + false_pos) if true_pos + false_pos else 0.0
+    recall = true_pos / (true_pos + false_neg) if true_pos + false_neg else 0.0
+    print(f"Threshold {DUPLICATE_THRESHOLD}: precision {precision:.3f}, recall {recall:.3f} "
+          f"({true_pos} TP, {false_pos} FP, {false_neg} FN)")
+    for kind in ("rescan", "resend", "amended", "amended rescan", "unseen"):
+        print(f"{kind:<15} flagged {flagged[kind] / args.duplicates:6.1%}, results reusable {reused[kind] / args.duplicates:6.1%}")
+    print(f"Candidates per lookup: mean {statistics.mean(candidate_counts):.1f}, max {max(candidate_counts)}")
+    for label, times in (("LSH lookup", lsh_times), ("Linear scan", scan_times)):
+        print(f"{label:<12} mean {statistics.mean(times) * 1000:.3f} ms, p95 {percentile(times, 95) * 1000:.3f} ms")
+
+if __name__ == "__main__":
+    main()
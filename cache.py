@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Default memory budget for the shared cache (in bytes)
+CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+# Seconds a cached report is trusted before it is re-checked against MongoDB
+# (bounds how long writes from other processes can go unseen)
+CACHE_VERIFY_SECONDS = float(os.getenv("REPORT_CACHE_VERIFY_SECONDS", 5))
+
+# Invalidations remembered for loads still in flight; loads older than the
+# oldest remembered one are conservatively not cached
+INVALIDATION_HISTORY = 1024
+
+# Rough in-memory size of a cached value (strings dominate report documents)
+def estimate_size(value):
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_size(v) for v in value)
+    if isinstance(value, (int, float)):
+        return 28
+    return 64
+
+# Process-wide LRU cache of reports and derived artifacts, keyed by (report_id, kind)
+class ReportCache:
+    def __init__(self, max_bytes=CACHE_MAX_BYTES, invalidation_history=INVALIDATION_HISTORY):
+        self.max_bytes = max_bytes
+        self.invalidation_history = invalidation_history
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        # Monotonic write counter and, per recently invalidated report, the
+        # counter value of its last invalidation; reads that raced with a
+        # write are detected by comparing against the token taken before them
+        self._writes = 0
+        self._invalidated = OrderedDict()
+        self._forgotten = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Look up a value; with validate, entries older than max_age seconds are
+    # re-checked first and count as a miss (and are dropped) if no longer valid
+    def get(self, report_id, kind, validate=None, max_age=0):
+        key = (report_id, kind)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, size, checked_at = entry
+            if validate is None or time.monotonic() - checked_at < max_age:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+
+        # Validation may query Mongo, so it runs outside the lock
+        valid = validate(value)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] is not value:
+                self.misses += 1
+                return None
+            if not valid:
+                self._bytes -= self._entries.pop(key)[1]
+                self.misses += 1
+                return None
+            self._entries[key] = (value, size, time.monotonic())
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    # Token to take before loading a value from Mongo and pass back to put()
+    def load_token(self):
+        with self._lock:
+            return self._writes
+
+    def put(self, report_id, kind, value, token=None):
+        key = (report_id, kind)
+        size = estimate_size(value)
+        with self._lock:
+            # The report changed (or may have) while the value was being loaded
+            if token is not None and (token < self._forgotten or self._invalidated.get(report_id, -1) > token):
+                return
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            # Values larger than the whole budget are not cached
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size, time.monotonic())
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    # Drop cached entries for a report (all kinds unless specified)
+    def invalidate(self, report_id, kinds=None):
+        with self._lock:
+            self._writes += 1
+            self._invalidated[report_id] = self._writes
+            self._invalidated.move_to_end(report_id)
+            if len(self._invalidated) > self.invalidation_history:
+                _, self._forgotten = self._invalidated.popitem(last=False)
+            for key in [k for k in self._entries if k[0] == report_id]:
+                if kinds is None or key[1] in kinds:
+                    self._bytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._writes += 1
+            self._invalidated.clear()
+            self._forgotten = self._writes
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+# Shared by every Streamlit session in this process
+report_cache = ReportCache()
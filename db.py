@@ -3,58 +3,116 @@ from datetime import datetime
 import os
 from bson.objectid import ObjectId
 from dotenv import load_dotenv
+from cache import report_cache, CACHE_VERIFY_SECONDS
 
 # Load MongoDB URI from .env
 load_dotenv()
 MONGO_URI = os.getenv("MONGODB_URL")
 
-# Setup MongoDB
-client = MongoClient(MONGO_URI)
+# Setup MongoDB (mongomock:// uses an in-memory stand-in for local testing)
+if MONGO_URI and MONGO_URI.startswith("mongomock://"):
+    import mongomock
+    client = mongomock.MongoClient()
+else:
+    client = MongoClient(MONGO_URI)
 db = client["WhiteCoatAI"]
 reports = db["MedicalReports"]
 
+# Create indexes (called once at startup; create_index is a no-op when they exist)
+def setup_indexes():
+    # Multikey index on LSH band keys for near-duplicate lookup
+    reports.create_index("lsh_bands")
+
 # Save a new uploaded document
-def save_report(filename, raw_text, summary, parsed_results):
+def save_report(filename, raw_text, summary, parsed_results, minhash=None, lsh_bands=None,
+                numeric_values=None, duplicate_of=None, results_from=None):
     doc = {
         "filename": filename,
         "raw_text": raw_text,
         "summary": summary,
         "parsed_results": parsed_results,
         "chat_history": [],
+        "chat_summary": "",
+        "summarized_turns": 0,
+        "minhash": minhash or [],
+        "lsh_bands": lsh_bands or [],
+        "numeric_values": numeric_values,
+        "duplicate_of": duplicate_of,
+        "results_from": results_from,
+        "version": 0,
         "uploaded_at": datetime.now()
     }
     result = reports.insert_one(doc)
     return str(result.inserted_id)
 
-# Retrieve report by ID
+# Whether a cached report still has the version stored in Mongo
+def _is_current(report):
+    current = reports.find_one({"_id": report["_id"]}, {"version": 1})
+    return current is not None and current.get("version", 0) == report.get("version", 0)
+
+# Retrieve report by ID (served from the shared cache when possible)
 def get_report(report_id):
-    return reports.find_one({"_id": ObjectId(report_id)})
+    # Other processes (API workers, Streamlit) write too, so a cached copy older than
+    # CACHE_VERIFY_SECONDS is version-checked against Mongo before it is used
+    report = report_cache.get(report_id, "report", validate=_is_current, max_age=CACHE_VERIFY_SECONDS)
+    if report is None:
+        token = report_cache.load_token()
+        report = reports.find_one({"_id": ObjectId(report_id)}, {"minhash": 0, "lsh_bands": 0, "numeric_values": 0})
+        if report is not None:
+            report_cache.put(report_id, "report", report, token)
+    return report
+
+# Find reports sharing at least one LSH band key (near-duplicate candidates)
+def find_duplicate_candidates(lsh_bands):
+    if not lsh_bands:
+        return []
+    return list(reports.find(
+        {"lsh_bands": {"$in": lsh_bands}},
+        {"filename": 1, "summary": 1, "parsed_results": 1, "minhash": 1, "numeric_values": 1}
+    ))
 
 # Add a chat message to a report
 def add_chat(report_id, user_msg, bot_msg):
     chat_entry = {"user": user_msg, "bot": bot_msg, "timestamp": datetime.now()}
     reports.update_one(
         {"_id": ObjectId(report_id)},
-        {"$push": {"chat_history": chat_entry}}
+        {"$push": {"chat_history": chat_entry}, "$inc": {"version": 1}}
     )
+    report_cache.invalidate(report_id, kinds=("report",))
 
-# Get all reports (optional for history display)
-def get_all_reports():
-    return list(reports.find().sort("uploaded_at", -1))
+# Store the rolling summary of chat turns older than the recent window
+def update_chat_summary(report_id, chat_summary, summarized_turns):
+    reports.update_one(
+        {"_id": ObjectId(report_id)},
+        {"$set": {"chat_summary": chat_summary, "summarized_turns": summarized_turns}, "$inc": {"version": 1}}
+    )
+    report_cache.invalidate(report_id, kinds=("report",))
+
+# Get all reports (optional for history display); limit=0 means no limit
+def get_all_reports(limit=0, skip=0, fields=None):
+    return list(reports.find({}, fields).sort("uploaded_at", -1).skip(skip).limit(limit))
 
 # Delete a report by ID
 def delete_report(report_id):
     result = reports.delete_one({"_id": ObjectId(report_id)})
+    report_cache.invalidate(report_id)
     return result.deleted_count
 
 # Update report metadata (e.g., rename file)
 def update_report_metadata(report_id, metadata):
     result = reports.update_one(
         {"_id": ObjectId(report_id)},
-        {"$set": metadata}
+        {"$set": metadata, "$inc": {"version": 1}}
     )
+    report_cache.invalidate(report_id)
     return result.modified_count
 
+# Delete every report
+def delete_all_reports():
+    result = reports.delete_many({})
+    report_cache.clear()
+    return result.deleted_count
+
 # Get report statistics
 def get_report_stats():
     total_reports = reports.count_documents({})
@@ -74,7 +132,7 @@ def get_report_stats():
     }
 
 # Search reports by filename or content
-def search_reports(query):
+def search_reports(query, limit=0, skip=0, fields=None):
     regex_query = {"$regex": query, "$options": "i"}  # case-insensitive search
     results = reports.find({
         "$or": [
@@ -82,6 +140,6 @@ def search_reports(query):
             {"raw_text": regex_query},
             {"summary": regex_query}
         ]
-    }).sort("uploaded_at", -1)
+    }, fields).sort("uploaded_at", -1).skip(skip).limit(limit)
     
     return list(results)
@@ -0,0 +1,106 @@
+import hashlib
+import random
+import re
+from collections import Counter, defaultdict
+
+# MinHash signature length, split into BANDS bands of ROWS rows for LSH
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+
+# Words per shingle
+SHINGLE_SIZE = 3
+
+# Estimated Jaccard similarity above which two reports count as duplicates
+# (re-scans of one report score ~0.55-0.9, different reports on one template < 0.2)
+DUPLICATE_THRESHOLD = 0.5
+
+# Words before a number that identify it (test name and units, e.g. "hemoglobin g dl")
+NUMBER_CONTEXT_WORDS = 3
+
+# Mersenne prime for the universal hash family (values fit in a Mongo int64)
+_PRIME = (1 << 61) - 1
+
+# Fixed seed so signatures stay comparable across processes and restarts
+_rng = random.Random(1729)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+def _hash(value, digest_size=8):
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=digest_size).digest(), "big")
+
+# Lowercase and keep only words so re-scans, reflowed lines and punctuation noise line up
+def normalize_text(text):
+    return re.findall(r"[a-z0-9]+(?:\.[0-9]+)?", text.lower())
+
+# Numbers (signs kept, so base excess -2 and 2 differ) or words; digits inside words aren't numbers
+_NUMBER_OR_WORD = re.compile(r"(?<![a-z0-9.])(-?[0-9]+(?:\.[0-9]+)?)(?![a-z0-9])|[a-z0-9]+")
+
+# Every number in a text as [context, number], where context is the preceding
+# words plus the number's position after them (e.g. ["cbc hemoglobin#0", "14.2"])
+def numeric_values(text):
+    context, position, values = [], 0, []
+    for match in _NUMBER_OR_WORD.finditer(text.lower()):
+        if match.group(1) is not None:
+            values.append([f"{' '.join(context)}#{position}", match.group(1)])
+            position += 1
+        else:
+            context = (context + [match.group(0)])[-NUMBER_CONTEXT_WORDS:]
+            position = 0
+    return values
+
+# Whether a near-duplicate carries the same numbers as the original. Numbers whose
+# context appears in both must be identical; numbers whose context only the original
+# has (e.g. garbled by OCR) must still appear in the copy. Numbers only in the copy
+# (fax header, page numbers, received dates) are ignored.
+def numbers_match(original_values, new_values):
+    if original_values is None:
+        return False
+    original, new = defaultdict(list), defaultdict(list)
+    for context, number in original_values:
+        original[context].append(number)
+    for context, number in new_values:
+        new[context].append(number)
+
+    if any(original[context] != new[context] for context in original.keys() & new.keys()):
+        return False
+    missing = Counter(number for context in original.keys() - new.keys() for number in original[context])
+    extra = Counter(number for context in new.keys() - original.keys() for number in new[context])
+    return not missing - extra
+
+# Set of hashed word shingles of a text
+def shingles(text, size=SHINGLE_SIZE):
+    words = normalize_text(text)
+    if len(words) < size:
+        return {_hash(" ".join(words), 4)} if words else set()
+    return {_hash(" ".join(words[i:i + size]), 4) for i in range(len(words) - size + 1)}
+
+# MinHash signature of a text (one minimum per hash permutation)
+def minhash_signature(text):
+    hashed = shingles(text)
+    if not hashed:
+        return []
+    return [min((a * h + b) % _PRIME for h in hashed) for a, b in _PERMUTATIONS]
+
+# LSH band keys of a signature; reports sharing any key are duplicate candidates
+def band_keys(signature):
+    if not signature:
+        return []
+    return [
+        f"{band}:{_hash(','.join(map(str, signature[band * ROWS:(band + 1) * ROWS])), 8):016x}"
+        for band in range(BANDS)
+    ]
+
+# Estimated Jaccard similarity of two signatures
+def estimate_similarity(signature_a, signature_b):
+    if not signature_a or len(signature_a) != len(signature_b):
+        return 0.0
+    return sum(a == b for a, b in zip(signature_a, signature_b)) / len(signature_a)
+
+# Most similar candidate at or above the threshold, as (candidate, similarity)
+def find_duplicate(signature, candidates, threshold=DUPLICATE_THRESHOLD):
+    best, best_similarity = None, 0.0
+    for candidate in candidates:
+        similarity = estimate_similarity(signature, candidate.get("minhash", []))
+        if similarity >= threshold and similarity > best_similarity:
+            best, best_similarity = candidate, similarity
+    return best, best_similarity
@@ -0,0 +1,97 @@
+import logging
+from db import update_chat_summary
+
+logger = logging.getLogger(__name__)
+
+# Number of most recent chat turns sent to the model verbatim
+RECENT_TURNS = 4
+
+# Turns folded into the summary at once; between RECENT_TURNS and
+# RECENT_TURNS + FOLD_BATCH turns stay verbatim, so folding runs once per batch
+FOLD_BATCH = 4
+
+# Upper bound on the rolling summary so the prompt stays a bounded size
+SUMMARY_MAX_WORDS = 150
+
+# Format a list of chat turns as plain dialogue
+def format_turns(turns):
+    return "\n".join(f"Patient: {turn['user']}\nWhiteCoatAI: {turn['bot']}" for turn in turns)
+
+# Log prompt/answer token usage reported with the response (no extra API call)
+def log_token_usage(report_id, call, prompt, response):
+    usage = getattr(response, "usage_metadata", None)
+    if usage is not None:
+        logger.info(
+            "%s for report %s: %d prompt tokens, %d answer tokens",
+            call, report_id, usage.prompt_token_count, usage.candidates_token_count
+        )
+    else:
+        # Older SDKs don't report usage; fall back to ~4 characters per token
+        logger.info(
+            "%s for report %s: ~%d prompt tokens, ~%d answer tokens (estimated)",
+            call, report_id, len(prompt) // 4, len(response.text) // 4
+        )
+
+# Cut a summary down to at most max_words words
+def truncate_words(text, max_words=SUMMARY_MAX_WORDS):
+    words = text.split()
+    return text if len(words) <= max_words else " ".join(words[:max_words])
+
+# Fold turns that fell out of the recent window into the report's rolling summary,
+# returning the summary and the number of turns it covers
+def update_rolling_summary(model, report, recent_turns=RECENT_TURNS, fold_batch=FOLD_BATCH):
+    history = report.get("chat_history", [])
+    summary = report.get("chat_summary", "")
+    summarized = report.get("summarized_turns", 0)
+
+    # Fold only once a full batch of turns has left the recent window
+    cutoff = max(len(history) - recent_turns, 0)
+    if cutoff - summarized < fold_batch:
+        return summary, summarized
+
+    prompt = f"""
+Update the running summary of a conversation between a patient and an AI medical assistant.
+Keep every symptom, medication, test value, concern and answer the patient may refer back to.
+Write at most {SUMMARY_MAX_WORDS} words.
+
+--- CURRENT SUMMARY ---
+{summary or "(empty)"}
+
+--- NEW TURNS ---
+{format_turns(history[summarized:cutoff])}
+
+Return only the updated summary.
+    """
+    response = model.generate_content(prompt)
+    log_token_usage(report["_id"], "Chat summary fold", prompt, response)
+    # The prompt only asks for the limit; enforce it so the summary can't grow per fold
+    summary = truncate_words(response.text.strip())
+
+    update_chat_summary(str(report["_id"]), summary, cutoff)
+    return summary, cutoff
+
+# Build the chat prompt from the report, the rolling summary and the unsummarized turns
+def build_chat_prompt(model, report, user_input, recent_turns=RECENT_TURNS):
+    chat_summary, summarized = update_rolling_summary(model, report, recent_turns)
+    recent = report.get("chat_history", [])[summarized:]
+
+    prompt = f"""
+You are an AI medical assistant. Use the following information to answer in a patient-friendly way.
+
+--- SUMMARY ---
+{report['summary']}
+
+--- FULL REPORT ---
+{report['raw_text']}
+
+--- EARLIER CONVERSATION ---
+{chat_summary or "(none)"}
+
+--- RECENT CONVERSATION ---
+{format_turns(recent) or "(none)"}
+
+Patient's question: {user_input}
+
+Respond in a friendly, helpful tone.
+    """
+    return prompt
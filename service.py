@@ -0,0 +1,232 @@
+import base64
+import copy
+import json
+import os
+import re
+from dotenv import load_dotenv
+from db import save_report, get_report, add_chat, find_duplicate_candidates
+from cache import report_cache
+from memory import build_chat_prompt, log_token_usage
+from dedup import minhash_signature, band_keys, find_duplicate, numeric_values, numbers_match
+
+# Reuse the summary/analysis of a near-duplicate report instead of calling the LLM again.
+# Off by default (duplicates are only flagged); even when on, results are reused only
+# if every test value in the original appears unchanged in the copy (see dedup.numbers_match)
+REUSE_DUPLICATE_RESULTS = os.getenv("REUSE_DUPLICATE_RESULTS", "false").lower() in ("1", "true", "yes")
+
+# Prompt used to pull chart-ready data out of a report
+VISUALIZATION_PROMPT = """
+            Based on the following medical document, generate data for 5 numerical visualizations:
+            1. Blood Test Results with normal ranges (bar chart)
+            2. Vital Signs over time (line chart if time-series data available)
+            3. Cholesterol Levels (HDL, LDL, Total) as a bar chart
+            4. Key Health Metrics Comparison (numerical indicators like BMI, blood pressure, glucose levels)
+            5. Lab Results Trends (if multiple dates available, show trends for key metrics)
+
+            For each visualization, provide the data in a structured JSON format that can be easily parsed.
+            Only include visualizations where relevant numerical data is actually present in the document.
+            Make sure all values are numeric when possible, or explicitly marked as string values when necessary.
+
+            Format your response exactly like this example:
+            ```json
+            {{
+                "visualization1": {{
+                    "title": "Blood Test Results",
+                    "type": "bar",
+                    "data": [
+                        {{"Test": "Hemoglobin", "Value": 14.2, "Normal Range Min": 13.5, "Normal Range Max": 17.5}},
+                        {{"Test": "WBC", "Value": 7.5, "Normal Range Min": 4.5, "Normal Range Max": 11.0}}
+                    ]
+                }},
+                "visualization2": {{
+                    "title": "Vital Signs Over Time",
+                    "type": "line",
+                    "data": [
+                        {{"Date": "2024-01-01", "Blood Pressure": 120, "Heart Rate": 72, "Temperature": 98.6}},
+                        {{"Date": "2024-01-15", "Blood Pressure": 118, "Heart Rate": 75, "Temperature": 98.4}}
+                    ]
+                }},
+                "visualization3": {{
+                    "title": "Cholesterol Levels",
+                    "type": "bar",
+                    "data": [
+                        {{"Type": "HDL", "Value": 62, "Target": 60}},
+                        {{"Type": "LDL", "Value": 128, "Target": 100}},
+                        {{"Type": "Total", "Value": 210, "Target": 200}}
+                    ]
+                }},
+                "visualization4": {{
+                    "title": "Key Health Metrics",
+                    "type": "radar",
+                    "data": [
+                        {{"Metric": "BMI", "Value": 24.2, "Ideal Range": 22.5}},
+                        {{"Metric": "Systolic BP", "Value": 122, "Ideal Range": 120}},
+                        {{"Metric": "Diastolic BP", "Value": 78, "Ideal Range": 80}},
+                        {{"Metric": "Glucose", "Value": 92, "Ideal Range": 90}}
+                    ]
+                }},
+                "visualization5": {{
+                    "title": "Lab Results Trends",
+                    "type": "line",
+                    "data": [
+                        {{"Date": "2023-10-01", "Hemoglobin": 14.0, "Glucose": 95, "Creatinine": 0.9}},
+                        {{"Date": "2024-01-15", "Hemoglobin": 14.2, "Glucose": 92, "Creatinine": 0.85}}
+                    ]
+                }}
+            }}
+            ```
+
+            Return ONLY the JSON, with no additional explanation. If a particular visualization cannot be created due to lack of data, exclude it from the JSON completely.
+
+            Medical document:
+            {raw_text}
+            """
+
+# Minimal response object mirroring the parts of Gemini's API we use
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = None
+
+# Deterministic stand-in for Gemini, for running the pipeline locally without an API key
+class FakeModel:
+    def generate_content(self, prompt):
+        if isinstance(prompt, list):
+            return FakeResponse(text="Extracted text of the uploaded PDF document.")
+        if "visualizations" in prompt:
+            return FakeResponse(text="```json\n{}\n```")
+        return FakeResponse(text=f"Fake response to a {len(prompt)} character prompt.")
+
+# Create the LLM client (Gemini, or the fake model when WHITECOAT_FAKE_LLM is set)
+def create_model():
+    load_dotenv()
+    if os.getenv("WHITECOAT_FAKE_LLM"):
+        return FakeModel()
+
+    import google.generativeai as genai
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+    return genai.GenerativeModel("models/gemini-flash-latest")
+
+# Extract text from raw file bytes (PDFs are read by Gemini)
+def extract_text(model, data, content_type):
+    if content_type == "application/pdf":
+        # Create a prompt for Gemini to extract text from the PDF
+        prompt = "Extract all text content from this PDF document. Format it clearly and preserve the structure."
+        parts = [
+            {"text": prompt},
+            {
+                "inline_data": {
+                    "mime_type": "application/pdf",
+                    "data": base64.b64encode(data).decode('utf-8')
+                }
+            }
+        ]
+        response = model.generate_content(parts)
+        return response.text
+    elif content_type == "text/plain":
+        return data.decode("utf-8")
+    else:
+        return ""
+
+# Summarize report text for a patient
+def summarize_text(model, raw_text):
+    prompt = f"Summarize this medical report for a patient in simple language:\n\n{raw_text}"
+    response = model.generate_content(prompt)
+    return response.text
+
+# Summarize extracted text and store it as a new report, flagging near-duplicates
+def create_report(model, filename, raw_text):
+    signature = minhash_signature(raw_text)
+    lsh_bands = band_keys(signature)
+    numbers = numeric_values(raw_text)
+    original, similarity = find_duplicate(signature, find_duplicate_candidates(lsh_bands))
+
+    # Text similarity ignores values, so a corrected result must never reuse the old summary
+    reuse = REUSE_DUPLICATE_RESULTS and original is not None and numbers_match(original.get("numeric_values"), numbers)
+    if reuse:
+        summary = original["summary"]
+        parsed_results = original.get("parsed_results", {})
+    else:
+        summary = summarize_text(model, raw_text)
+        parsed_results = {}  # You can replace this with actual parsed test data later
+
+    report_id = save_report(
+        filename=filename,
+        raw_text=raw_text,
+        summary=summary,
+        parsed_results=parsed_results,
+        minhash=signature,
+        lsh_bands=lsh_bands,
+        numeric_values=numbers,
+        duplicate_of=str(original["_id"]) if original else None,
+        results_from=str(original["_id"]) if reuse else None
+    )
+
+    duplicate = None
+    if original:
+        duplicate = {
+            "report_id": str(original["_id"]),
+            "filename": original["filename"],
+            "similarity": similarity,
+            "reused_results": reuse
+        }
+    return report_id, summary, duplicate
+
+# Full ingestion pipeline: extract, summarize and save one document
+def ingest_document(model, filename, content_type, data):
+    raw_text = extract_text(model, data, content_type)
+    if not raw_text.strip():
+        raise ValueError(f"No text could be extracted from {filename}")
+
+    report_id, summary, duplicate = create_report(model, filename, raw_text)
+    return {"report_id": report_id, "filename": filename, "summary": summary, "duplicate_of": duplicate}
+
+# Generate visualization data for a report, shared across callers through the cache
+def analyze_report(model, report_id):
+    token = report_cache.load_token()
+    report = get_report(report_id)
+    result_text = None
+    # Reuse the analysis of the report this one's summary was taken from
+    if report.get("results_from"):
+        result_text = report_cache.get(report["results_from"], "visualizations")
+    if result_text is None:
+        result_text = report_cache.get(report_id, "visualizations")
+    if result_text is None:
+        response = model.generate_content(VISUALIZATION_PROMPT.format(raw_text=report['raw_text']))
+        result_text = response.text
+        report_cache.put(report_id, "visualizations", result_text, token)
+    return result_text
+
+# Parse the JSON block of an analysis response (raises json.JSONDecodeError)
+def parse_visualizations(result_text):
+    # Find JSON between triple backticks if present
+    json_match = re.search(r'```json\s*(.*?)\s*```', result_text, re.DOTALL)
+    json_str = json_match.group(1) if json_match else result_text
+    return json.loads(json_str)
+
+# Answer a question about a report and record the exchange
+def answer_question(model, report_id, question):
+    report = get_report(report_id)
+    prompt = build_chat_prompt(model, report, question)
+    response = model.generate_content(prompt)
+    reply = response.text
+    log_token_usage(report_id, "Chat turn", prompt, response)
+
+    add_chat(report_id, question, reply)
+    return reply
+
+# Make a report JSON-serializable without touching the (possibly cached) original
+def serialize_report(report):
+    report_copy = copy.deepcopy(report)
+    # Dedup signatures are internal lookup data
+    report_copy.pop('minhash', None)
+    report_copy.pop('lsh_bands', None)
+    # Convert ObjectId to string for JSON serialization
+    report_copy['_id'] = str(report_copy['_id'])
+    # Convert datetime to string
+    report_copy['uploaded_at'] = report_copy['uploaded_at'].isoformat()
+    # Convert chat history timestamps
+    for chat in report_copy.get('chat_history', []):
+        if 'timestamp' in chat:
+            chat['timestamp'] = chat['timestamp'].isoformat()
+    return report_copy
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+# Run against the in-memory Mongo stand-in; must be set before db is imported
+os.environ["MONGODB_URL"] = "mongomock://"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import delete_all_reports
+
+
+@pytest.fixture(autouse=True)
+def empty_database():
+    delete_all_reports()
+    yield
+    delete_all_reports()
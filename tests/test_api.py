@@ -0,0 +1,152 @@
+import logging
+
+from bson.objectid import ObjectId
+import pytest
+from fastapi.testclient import TestClient
+
+import db
+from api import create_app
+from cache import report_cache
+from db import reports
+from service import FakeModel
+
+
+@pytest.fixture
+def client():
+    return TestClient(create_app(model=FakeModel()))
+
+
+def ingest(client, filename="cbc.txt", text="Hemoglobin 14.2 g/dL\nWBC 7.5 x10^3/uL"):
+    return client.post("/reports", files={"file": (filename, text.encode(), "text/plain")})
+
+
+def test_ingest_single_report(client):
+    response = ingest(client)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["filename"] == "cbc.txt"
+    assert body["summary"]
+    assert body["duplicate_of"] is None
+
+    report = client.get(f"/reports/{body['report_id']}").json()
+    assert report["raw_text"].startswith("Hemoglobin 14.2")
+    assert report["chat_history"] == []
+    assert "minhash" not in report and "lsh_bands" not in report
+
+
+def test_ingest_without_text_returns_422(client):
+    response = client.post("/reports", files={"file": ("scan.png", b"\x89PNG", "image/png")})
+    assert response.status_code == 422
+
+
+def test_batch_ingest_reports_per_file_results(client):
+    files = [
+        ("files", ("a.txt", b"Glucose 92 mg/dL", "text/plain")),
+        ("files", ("b.txt", b"Creatinine 0.9 mg/dL", "text/plain")),
+        ("files", ("c.bin", b"\x00\x01", "application/octet-stream")),
+    ]
+    results = client.post("/reports/batch", files=files).json()
+    assert [result["filename"] for result in results] == ["a.txt", "b.txt", "c.bin"]
+    assert "report_id" in results[0] and "report_id" in results[1]
+    assert "error" in results[2]
+    assert client.get("/stats").json()["reports"]["total_reports"] == 2
+
+
+@pytest.mark.parametrize("report_id", ["not-an-id", str(ObjectId())])
+def test_unknown_report_returns_404(client, report_id):
+    assert client.get(f"/reports/{report_id}").status_code == 404
+    assert client.post(f"/reports/{report_id}/chat", json={"question": "Hi"}).status_code == 404
+
+
+def test_chat_records_history(client):
+    report_id = ingest(client).json()["report_id"]
+    for question in ("Is my hemoglobin normal?", "What about WBC?"):
+        response = client.post(f"/reports/{report_id}/chat", json={"question": question})
+        assert response.status_code == 200
+        assert response.json()["reply"]
+
+    history = client.get(f"/reports/{report_id}").json()["chat_history"]
+    assert [turn["user"] for turn in history] == ["Is my hemoglobin normal?", "What about WBC?"]
+
+
+# Simulate another worker appending a turn without touching this process's cache
+def write_from_another_process(report_id):
+    reports.update_one(
+        {"_id": ObjectId(report_id)},
+        {"$push": {"chat_history": {"user": "q", "bot": "a"}}, "$inc": {"version": 1}}
+    )
+
+
+def test_cached_report_refreshed_after_write_from_another_process(client, monkeypatch):
+    monkeypatch.setattr(db, "CACHE_VERIFY_SECONDS", 0)
+    report_id = ingest(client).json()["report_id"]
+    client.get(f"/reports/{report_id}")
+
+    write_from_another_process(report_id)
+    assert len(client.get(f"/reports/{report_id}").json()["chat_history"]) == 1
+
+
+def test_stale_cache_entries_count_as_misses(client, monkeypatch):
+    monkeypatch.setattr(db, "CACHE_VERIFY_SECONDS", 0)
+    report_id = ingest(client).json()["report_id"]
+    client.get(f"/reports/{report_id}")
+
+    before = report_cache.stats()
+    for turn in range(5):
+        write_from_another_process(report_id)
+        assert len(client.get(f"/reports/{report_id}").json()["chat_history"]) == turn + 1
+    after = report_cache.stats()
+    assert after["hits"] == before["hits"]
+    assert after["misses"] - before["misses"] == 5
+
+
+def test_recently_verified_report_is_served_without_version_check(client, monkeypatch):
+    monkeypatch.setattr(db, "CACHE_VERIFY_SECONDS", 60)
+    report_id = ingest(client).json()["report_id"]
+    client.get(f"/reports/{report_id}")
+
+    # Within the verify window an out-of-process write isn't seen yet
+    write_from_another_process(report_id)
+    hits = report_cache.stats()["hits"]
+    assert client.get(f"/reports/{report_id}").json()["chat_history"] == []
+    assert report_cache.stats()["hits"] == hits + 1
+
+
+def test_search_treats_query_as_plain_text(client):
+    ingest(client, "a.txt", "LDL (calculated) 128 mg/dL")
+    ingest(client, "b.txt", "HDL 62 mg/dL")
+
+    assert client.get("/reports", params={"q": "("}).status_code == 200
+    results = client.get("/reports", params={"q": "(calculated)"}).json()
+    assert [result["filename"] for result in results] == ["a.txt"]
+    assert "raw_text" not in results[0]
+
+
+def test_list_reports_is_paginated(client):
+    for i in range(3):
+        ingest(client, f"{i}.txt", f"Report number {i} glucose {90 + i}")
+
+    first_page = client.get("/reports", params={"limit": 2}).json()
+    second_page = client.get("/reports", params={"limit": 2, "skip": 2}).json()
+    assert len(first_page) == 2 and len(second_page) == 1
+    assert client.get("/reports", params={"limit": 0}).status_code == 422
+
+
+def test_chat_token_usage_is_logged(client, caplog):
+    report_id = ingest(client).json()["report_id"]
+    with caplog.at_level(logging.INFO, logger="memory"):
+        client.post(f"/reports/{report_id}/chat", json={"question": "Is this normal?"})
+    assert any(record.getMessage().startswith("Chat turn") for record in caplog.records)
+
+
+def test_create_app_enables_info_logging():
+    create_app(model=FakeModel())
+    assert logging.getLogger("memory").isEnabledFor(logging.INFO)
+
+
+def test_stats(client):
+    ingest(client)
+    stats = client.get("/stats").json()
+    assert stats["reports"]["total_reports"] == 1
+    assert stats["reports"]["most_recent"] is not None
+    assert {"entries", "bytes", "hit_rate"} <= set(stats["cache"])
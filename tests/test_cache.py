@@ -0,0 +1,129 @@
+from cache import ReportCache, estimate_size
+
+
+def test_get_put_and_hit_rate():
+    cache = ReportCache(max_bytes=1000)
+    assert cache.get("a", "report") is None
+    cache.put("a", "report", "text")
+    assert cache.get("a", "report") == "text"
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+    assert stats["bytes"] == estimate_size("text")
+
+
+def test_evicts_least_recently_used_within_byte_budget():
+    cache = ReportCache(max_bytes=100)
+    cache.put("a", "report", "a" * 40)
+    cache.put("b", "report", "b" * 40)
+    cache.get("a", "report")  # "b" is now least recently used
+    cache.put("c", "report", "c" * 40)
+
+    assert cache.get("b", "report") is None
+    assert cache.get("a", "report") is not None
+    assert cache.get("c", "report") is not None
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["bytes"] == 80
+
+
+def test_value_larger_than_budget_is_not_cached():
+    cache = ReportCache(max_bytes=100)
+    cache.put("a", "report", "a" * 40)
+    cache.put("b", "report", "b" * 101)
+
+    assert cache.get("b", "report") is None
+    assert cache.get("a", "report") == "a" * 40
+    assert cache.stats()["bytes"] == 40
+
+
+def test_replacing_a_value_updates_the_byte_count():
+    cache = ReportCache(max_bytes=100)
+    cache.put("a", "report", "a" * 40)
+    cache.put("a", "report", "a" * 10)
+    assert cache.stats()["bytes"] == 10
+
+
+def test_invalidate_by_kind_keeps_other_kinds():
+    cache = ReportCache()
+    cache.put("a", "report", "doc")
+    cache.put("a", "visualizations", "json")
+    cache.put("b", "report", "other")
+
+    cache.invalidate("a", kinds=("report",))
+    assert cache.get("a", "report") is None
+    assert cache.get("a", "visualizations") == "json"
+
+    cache.invalidate("a")
+    assert cache.get("a", "visualizations") is None
+    assert cache.get("b", "report") == "other"
+    assert cache.stats()["bytes"] == estimate_size("other")
+
+
+def test_read_racing_with_invalidation_is_not_cached():
+    cache = ReportCache()
+    token = cache.load_token()      # thread A misses and starts reading Mongo
+    cache.invalidate("a")           # thread B runs add_chat
+    cache.put("a", "report", "stale", token)
+    assert cache.get("a", "report") is None
+
+    # A read started after the write is cached normally
+    cache.put("a", "report", "fresh", cache.load_token())
+    assert cache.get("a", "report") == "fresh"
+
+
+def test_invalidating_another_report_does_not_block_puts():
+    cache = ReportCache()
+    token = cache.load_token()
+    cache.invalidate("b")
+    cache.put("a", "report", "doc", token)
+    assert cache.get("a", "report") == "doc"
+
+
+def test_clear_rejects_reads_started_before_it():
+    cache = ReportCache()
+    cache.put("a", "report", "doc")
+    token = cache.load_token()
+    cache.clear()
+
+    cache.put("b", "report", "stale", token)
+    assert cache.get("a", "report") is None
+    assert cache.get("b", "report") is None
+    assert cache.stats()["bytes"] == 0
+
+
+def test_invalidation_history_is_bounded():
+    cache = ReportCache(invalidation_history=10)
+    for i in range(10000):
+        cache.invalidate(f"report-{i}")
+    assert len(cache._invalidated) == 10
+
+    # A load older than the remembered history can't be checked, so it isn't cached
+    token = cache.load_token()
+    for i in range(20):
+        cache.invalidate(f"other-{i}")
+    cache.put("a", "report", "doc", token)
+    assert cache.get("a", "report") is None
+
+
+def test_failed_validation_counts_as_miss_and_drops_entry():
+    cache = ReportCache()
+    cache.put("a", "report", "doc")
+    assert cache.get("a", "report", validate=lambda value: False) is None
+    assert cache.get("a", "report") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (0, 2, 0)
+
+
+def test_validation_is_skipped_within_max_age():
+    cache = ReportCache()
+    checks = []
+    validate = lambda value: checks.append(value) or True
+
+    cache.put("a", "report", "doc")
+    assert cache.get("a", "report", validate=validate, max_age=60) == "doc"
+    assert checks == []
+
+    assert cache.get("a", "report", validate=validate, max_age=0) == "doc"
+    assert checks == ["doc"]
+    assert cache.stats()["hits"] == 2
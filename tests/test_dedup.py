@@ -0,0 +1,131 @@
+import pytest
+
+import service
+from dedup import (
+    BANDS, DUPLICATE_THRESHOLD, NUM_PERM, band_keys, estimate_similarity, find_duplicate, minhash_signature,
+    numbers_match, numeric_values
+)
+from service import FakeModel
+
+REPORT = """Northside Clinic - Laboratory Report
+Patient: Maria Garcia    MRN: 482910
+Test                Result      Units        Reference Range
+Hemoglobin          14.2        g/dL         12.0 - 17.5
+WBC                 7.5         x10^3/uL     4.0 - 11.0
+Glucose             92.0        mg/dL        70 - 140
+LDL                 128.0       mg/dL        60 - 190
+Comments: Fasting specimen."""
+
+
+def test_empty_text_has_no_signature_or_bands():
+    assert minhash_signature("") == []
+    assert minhash_signature("  ... \n") == []
+    assert band_keys([]) == []
+    assert find_duplicate([], [{"minhash": minhash_signature(REPORT)}]) == (None, 0.0)
+
+
+def test_text_shorter_than_one_shingle_still_gets_a_signature():
+    signature = minhash_signature("Glucose 92")
+    assert len(signature) == NUM_PERM
+    assert signature == minhash_signature("GLUCOSE,  92")
+    assert signature != minhash_signature("Glucose 93")
+
+
+def test_signature_is_deterministic_and_banded():
+    signature = minhash_signature(REPORT)
+    assert signature == minhash_signature(REPORT)
+    keys = band_keys(signature)
+    assert len(keys) == BANDS
+    assert len(set(keys)) == BANDS
+
+
+def test_reformatted_copy_is_found_and_unrelated_report_is_not():
+    resend = "\n".join(" ".join(line.split()) for line in REPORT.split("\n")).upper()
+    other = "City Diagnostics - Urinalysis\nColor yellow\nClarity clear\nProtein negative\nKetones negative"
+    candidates = [{"_id": "other", "minhash": minhash_signature(other)}, {"_id": "original", "minhash": minhash_signature(REPORT)}]
+
+    match, similarity = find_duplicate(minhash_signature(resend), candidates)
+    assert match["_id"] == "original"
+    assert similarity == 1.0
+    assert find_duplicate(minhash_signature(other), candidates[1:]) == (None, 0.0)
+
+
+def test_threshold_is_inclusive():
+    signature = list(range(NUM_PERM))
+    half = NUM_PERM // 2
+    at_threshold = signature[:half] + [-1] * (NUM_PERM - half)
+    below = signature[:half - 1] + [-1] * (NUM_PERM - half + 1)
+
+    assert estimate_similarity(signature, at_threshold) == 0.5
+    match, similarity = find_duplicate(signature, [{"minhash": at_threshold}], threshold=0.5)
+    assert match is not None and similarity == 0.5
+    assert find_duplicate(signature, [{"minhash": below}], threshold=0.5) == (None, 0.0)
+
+
+def test_mismatched_signatures_are_not_similar():
+    assert estimate_similarity([1, 2, 3], [1, 2]) == 0.0
+    assert estimate_similarity([], []) == 0.0
+
+
+def test_numeric_values_are_keyed_by_preceding_words():
+    assert numeric_values("Hemoglobin 14.2 g/dL 12.0 - 17.5") == [
+        ["hemoglobin#0", "14.2"], ["hemoglobin g dl#0", "12.0"], ["hemoglobin g dl#1", "17.5"]
+    ]
+    assert numeric_values("Base excess -2") == [["base excess#0", "-2"]]
+    assert numeric_values("Hemog1obin x10") == []
+
+
+def fax(text):
+    return "FAX 555-0142  Page 1/1  Received 3/14/2024\n" + text + "\nThis facsimile is confidential."
+
+
+def test_numbers_match_ignores_whitespace_and_new_header_numbers():
+    original = numeric_values(REPORT)
+    assert numbers_match(original, numeric_values(REPORT.replace("    ", " ").upper()))
+    assert numbers_match(original, numeric_values(fax(REPORT)))
+
+
+def test_numbers_match_rejects_changed_or_sign_flipped_values():
+    original = numeric_values(REPORT)
+    assert not numbers_match(original, numeric_values(REPORT.replace("14.2", "15.2")))
+    assert not numbers_match(original, numeric_values(fax(REPORT.replace("92.0", "-92.0"))))
+    assert not numbers_match(numeric_values("Base excess 2"), numeric_values("Base excess -2"))
+    assert not numbers_match(None, original)
+
+
+def test_numbers_match_catches_changed_value_behind_garbled_label():
+    # OCR garbles the label, so the row has no shared context; the old value must still be present
+    garbled = REPORT.replace("Hemoglobin", "Hem0g1obin")
+    assert numbers_match(numeric_values(REPORT), numeric_values(garbled))
+    assert not numbers_match(numeric_values(REPORT), numeric_values(garbled.replace("14.2", "11.9")))
+
+
+def amended(text):
+    return text.replace("14.2", "11.9")
+
+
+@pytest.mark.parametrize("reuse", [False, True])
+def test_amended_report_is_flagged_but_never_reuses_results(monkeypatch, reuse):
+    monkeypatch.setattr(service, "REUSE_DUPLICATE_RESULTS", reuse)
+    model = FakeModel()
+    original_id, _, _ = service.create_report(model, "cbc.txt", REPORT)
+
+    _, summary, duplicate = service.create_report(model, "cbc_corrected.txt", amended(REPORT))
+    assert duplicate["report_id"] == original_id
+    assert duplicate["similarity"] >= DUPLICATE_THRESHOLD
+    assert duplicate["reused_results"] is False
+
+
+def test_faxed_copy_reuses_results_only_when_enabled(monkeypatch):
+    model = FakeModel()
+    original_id, _, _ = service.create_report(model, "cbc.txt", REPORT)
+
+    _, _, duplicate = service.create_report(model, "cbc_fax.txt", fax(REPORT))
+    assert duplicate["report_id"] == original_id and duplicate["reused_results"] is False
+
+    monkeypatch.setattr(service, "REUSE_DUPLICATE_RESULTS", True)
+    report_id, summary, duplicate = service.create_report(model, "cbc_fax2.txt", fax(REPORT))
+    assert duplicate["reused_results"] is True
+    # The earlier fax is the closest match, and it carries a summary of its own
+    assert summary == service.get_report(duplicate["report_id"])["summary"]
+    assert service.get_report(report_id)["results_from"] == duplicate["report_id"]
@@ -0,0 +1,83 @@
+import logging
+
+import service
+from db import get_report
+from memory import FOLD_BATCH, RECENT_TURNS, SUMMARY_MAX_WORDS, truncate_words
+from service import FakeModel, FakeResponse
+
+
+class RecordingModel(FakeModel):
+    # Fake model that counts summary folds and can answer them at any length
+
+    def __init__(self, summary_words=10):
+        self.summary_words = summary_words
+        self.folds = 0
+
+    def generate_content(self, prompt):
+        if isinstance(prompt, str) and "running summary" in prompt:
+            self.folds += 1
+            return FakeResponse(text=" ".join(["word"] * self.summary_words))
+        return super().generate_content(prompt)
+
+
+def chat(model, report_id, turns):
+    for i in range(turns):
+        service.answer_question(model, report_id, f"Question {i}?")
+
+
+def new_report(model):
+    report_id, _, _ = service.create_report(model, "cbc.txt", "Hemoglobin 14.2 g/dL")
+    return report_id
+
+
+def test_no_fold_until_a_full_batch_leaves_the_window():
+    model = RecordingModel()
+    report_id = new_report(model)
+
+    # The prompt for question n sees n earlier turns; folding needs RECENT_TURNS + FOLD_BATCH of them
+    chat(model, report_id, RECENT_TURNS + FOLD_BATCH)
+    report = get_report(report_id)
+    assert model.folds == 0
+    assert report["summarized_turns"] == 0
+    assert report["chat_summary"] == ""
+
+
+def test_summarized_turns_advance_one_batch_at_a_time():
+    model = RecordingModel()
+    report_id = new_report(model)
+
+    chat(model, report_id, RECENT_TURNS + FOLD_BATCH + 1)
+    assert model.folds == 1
+    assert get_report(report_id)["summarized_turns"] == FOLD_BATCH
+
+    # Nothing more is folded until another full batch has left the window
+    chat(model, report_id, FOLD_BATCH - 1)
+    assert model.folds == 1
+    chat(model, report_id, 1)
+    assert model.folds == 2
+    assert get_report(report_id)["summarized_turns"] == 2 * FOLD_BATCH
+
+
+def test_summary_is_truncated_to_the_word_limit():
+    model = RecordingModel(summary_words=SUMMARY_MAX_WORDS * 3)
+    report_id = new_report(model)
+
+    chat(model, report_id, RECENT_TURNS + FOLD_BATCH + 1)
+    assert len(get_report(report_id)["chat_summary"].split()) == SUMMARY_MAX_WORDS
+
+
+def test_truncate_words_keeps_short_text_unchanged():
+    assert truncate_words("  Low iron,\nfollow up.  ", 10) == "  Low iron,\nfollow up.  "
+    assert truncate_words("one two three four", 2) == "one two"
+
+
+def test_fold_and_answer_token_usage_are_logged(caplog):
+    model = RecordingModel()
+    report_id = new_report(model)
+
+    with caplog.at_level(logging.INFO, logger="memory"):
+        chat(model, report_id, RECENT_TURNS + FOLD_BATCH + 1)
+    messages = [record.getMessage() for record in caplog.records]
+    assert sum(message.startswith("Chat turn") for message in messages) == RECENT_TURNS + FOLD_BATCH + 1
+    assert sum(message.startswith("Chat summary fold") for message in messages) == 1
+    assert all("(estimated)" in message for message in messages)